@@ -1,11 +1,40 @@
 import joblib
 import gseapy as gp
 import os
+import logging
+import zipfile
+from functions import build_centroid_index, save_centroid_index, load_centroid_index, build_deg_index
 
 DATA_PATH = os.path.join(os.path.dirname(__file__), 'data')
 
-sc_samples = joblib.load(os.path.join(DATA_PATH, 'sc_samples.pkl'))
+SC_SAMPLES_PATH = os.path.join(DATA_PATH, 'sc_samples.pkl')
+CENTROID_INDEX_PATH = os.path.join(DATA_PATH, 'centroid_index.npz')
+
+sc_samples = joblib.load(SC_SAMPLES_PATH)
 
 degs = joblib.load(os.path.join(DATA_PATH, 'degs.pkl'))
 
+deg_index = build_deg_index(degs)
+
 libraries = gp.get_library_name(organism="Human")
+
+logger = logging.getLogger(__name__)
+
+# Rebuild the centroid index whenever it is missing, outdated or older than sc_samples.pkl
+centroid_index = None
+if (os.path.exists(CENTROID_INDEX_PATH) and
+        os.path.getmtime(CENTROID_INDEX_PATH) >= os.path.getmtime(SC_SAMPLES_PATH)):
+    try:
+        centroid_index = load_centroid_index(CENTROID_INDEX_PATH)
+    except (ValueError, OSError, zipfile.BadZipFile, KeyError) as e:
+        logger.warning("Could not load centroid index from %s (%s); rebuilding it.", CENTROID_INDEX_PATH, e)
+
+if centroid_index is None:
+    centroid_index = build_centroid_index(sc_samples)
+    try:
+        save_centroid_index(centroid_index, CENTROID_INDEX_PATH)
+    except OSError as e:
+        logger.warning(
+            "Could not save centroid index to %s (%s); it will be rebuilt on every start.",
+            CENTROID_INDEX_PATH, e
+        )
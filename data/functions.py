@@ -7,6 +7,9 @@ import matplotlib.pyplot as plt
 import gseapy as gp
 import textwrap
 import harmonypy as hm
+from scipy import sparse
+import os
+import tempfile
 
 
 def compare_centroids_distance_correlation_from_df(
@@ -211,6 +214,30 @@ def cross_modal_harmony_embeddings_from_df(
 
     return pseudo_h, bulk_h
 
+def bulk_pseudo_embeddings(sc_data: dict, bulk_df: pd.DataFrame, sigma: float = 0.1, n_pcs: int = 50):
+    """
+    Integrate bulk samples with the pseudo-bulk centroids of one `sc_samples` dataset.
+
+    Returns:
+        pseudo_h: Harmony embedding of the pseudo-bulk centroids.
+        bulk_h: Harmony embedding of the bulk samples, in the same space as pseudo_h.
+        sample_types: Series mapping each pseudo-bulk sample to 'cell_line' or 'primary_tumor'.
+    """
+    pseudo_h, bulk_h = cross_modal_harmony_embeddings_from_df(
+        df_pca=sc_data['df_pca'],
+        bulk_df=bulk_df,
+        scaler=sc_data['scaler'],
+        pca=sc_data['pca'],
+        hvg_genes=sc_data['hv_genes'],
+        sigma=sigma,
+        n_pcs=n_pcs
+    )
+
+    sample_to_ds = sc_data['df_pca'].drop_duplicates('sample').set_index('sample')['dataset']
+    sample_types = sample_to_ds.apply(lambda x: 'cell_line' if x == 'CCLE' else 'primary_tumor')
+
+    return pseudo_h, bulk_h, sample_types
+
 def compute_distance_correlation_matrix(pseudo_h: pd.DataFrame, bulk_h: pd.DataFrame):
     """
     Compute distance correlation between each bulk sample and each pseudo-bulk centroid
@@ -309,4 +336,360 @@ def plot_top_combinations(correlation_matrix, filter_type, sample_types, top_n=5
     
     plt.tight_layout()
     
-    return plt.gcf()
\ No newline at end of file
+    return plt.gcf()
+
+CENTROID_INDEX_VERSION = 2
+
+def build_centroid_index(sc_samples: dict, sample_col: str = 'sample', dataset_col: str = 'dataset'):
+    """
+    Build a nearest-neighbour search index over the per-sample centroids of every
+    dataset in `sc_samples`, in the Harmony PC space ('df_pca_harmony').
+
+    Each dataset has its own scaler and PCA, so its PCs are not comparable with
+    those of another dataset: the index stores all datasets side by side but
+    queries only rank samples within one dataset.
+
+    Returns:
+        index: dict returned by `build_centroid_index_from_centroids`.
+    """
+    centroids, sample_types = {}, {}
+
+    for cancer, sc_data in sc_samples.items():
+        df = sc_data['df_pca_harmony']
+        pc_cols = [c for c in df.columns if c.startswith('PC')]
+        centroids[cancer] = df.groupby(sample_col, observed=True)[pc_cols].mean()
+        sample_types[cancer] = (
+            df
+            .drop_duplicates(sample_col)
+            .set_index(sample_col)[dataset_col]
+            .apply(lambda x: 'cell_line' if x == 'CCLE' else 'primary_tumor')
+        )
+
+    return build_centroid_index_from_centroids(centroids, sample_types)
+
+def build_centroid_index_from_centroids(centroids: dict, sample_types: dict):
+    """
+    Build a centroid index from pre-computed centroids.
+
+    Args:
+        centroids: dict of cancer → DataFrame (samples × PCs).
+        sample_types: dict of cancer → Series mapping sample to
+                      'cell_line' or 'primary_tumor'.
+
+    Returns:
+        index: dict with 'vectors' (centroids, NaN-padded to the widest dataset),
+               'unit' (row-standardised centroids used for candidate generation),
+               'samples', 'cancers', 'sample_types', 'cancer_names',
+               'cancer_n_pcs' and 'version'.
+    """
+    width = max(c.shape[1] for c in centroids.values())
+    vectors, unit, samples, cancers, types = [], [], [], [], []
+
+    for cancer, cent in centroids.items():
+        values = cent.values.astype(np.float64)
+        pad = np.full((len(cent), width - values.shape[1]), np.nan)
+        vectors.append(np.hstack([values, pad]))
+        unit.append(np.hstack([_standardize_rows(values), pad]))
+        samples.extend(cent.index.astype(str))
+        cancers.extend([cancer] * len(cent))
+        types.extend(sample_types[cancer].reindex(cent.index).values)
+
+    return {
+        'vectors': np.vstack(vectors),
+        'unit': np.vstack(unit),
+        'samples': np.array(samples),
+        'cancers': np.array(cancers),
+        'sample_types': np.array(types, dtype=str),
+        'cancer_names': np.array(list(centroids.keys())),
+        'cancer_n_pcs': np.array([c.shape[1] for c in centroids.values()]),
+        'version': np.array(CENTROID_INDEX_VERSION),
+    }
+
+def _standardize_rows(mat):
+    """
+    Center each row and scale it to unit norm, so that a dot product between
+    two rows is their Pearson correlation.
+    """
+    mat = np.atleast_2d(mat)
+    centered = mat - mat.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(centered, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return centered / norms
+
+def save_centroid_index(index: dict, path: str):
+    """
+    Persist a centroid index to disk as a compressed .npz file.
+
+    The file is written next to `path` first and then moved into place, so an
+    interrupted save never leaves a truncated index behind.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.npz.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez_compressed(f, **index)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def load_centroid_index(path: str):
+    """
+    Load a centroid index saved with `save_centroid_index`.
+
+    Raises ValueError if the file was written by another version of the index format.
+    """
+    with np.load(path, allow_pickle=False) as f:
+        index = {key: f[key] for key in f.files}
+
+    if 'version' not in index or int(index['version']) != CENTROID_INDEX_VERSION:
+        raise ValueError(f"Centroid index at {path} has an outdated format.")
+    return index
+
+def query_centroid_index(
+    index: dict,
+    cancer: str,
+    query,
+    top_k: int = 10,
+    filter_type: str = 'all',
+    n_candidates: int = 200,
+    exclude=None
+):
+    """
+    Find the `top_k` centroids of one dataset most similar to a query vector.
+
+    Candidates are the centroids with the largest absolute Pearson correlation
+    to the query (one matrix product), then re-ranked with exact distance
+    correlation, which is also high for anticorrelated vectors.
+
+    Args:
+        index: index returned by `build_centroid_index` or `load_centroid_index`.
+        cancer: dataset to search; the query must be in that dataset's PC space.
+        query: vector with one value per PC of `cancer`.
+        top_k: number of results to return.
+        filter_type: 'all', 'primary_tumor' or 'cell_line'.
+        n_candidates: number of candidates passed to the exact re-ranking.
+        exclude: optional sample to leave out of the results.
+
+    Returns:
+        DataFrame with columns Cancer, Sample, Sample Type, Distance Correlation.
+    """
+    hit = np.flatnonzero(index['cancer_names'] == cancer)
+    if hit.size == 0:
+        raise ValueError(f"Dataset {cancer} not found in the index.")
+    n_pcs = int(index['cancer_n_pcs'][hit[0]])
+
+    query = np.asarray(query, dtype=np.float64).ravel()
+    if query.shape[0] != n_pcs:
+        raise ValueError(f"Query has {query.shape[0]} PCs, {cancer} has {n_pcs}.")
+
+    mask = index['cancers'] == cancer
+    if filter_type in ('primary_tumor', 'cell_line'):
+        mask &= index['sample_types'] == filter_type
+    if exclude is not None:
+        mask &= index['samples'] != str(exclude)
+
+    rows = np.flatnonzero(mask)
+    if rows.size == 0:
+        raise ValueError("No samples found with given criteria.")
+
+    vectors = index['vectors'][rows, :n_pcs]
+    scores = np.abs(index['unit'][rows, :n_pcs] @ _standardize_rows(query)[0])
+    n_candidates = min(max(n_candidates, top_k), rows.size)
+    candidates = np.argpartition(-scores, n_candidates - 1)[:n_candidates]
+
+    dcorr = np.empty(candidates.size)
+    for i, c in enumerate(candidates):
+        try:
+            dcorr[i] = dcor.distance_correlation(vectors[c], query)
+        except Exception:
+            dcorr[i] = np.nan
+
+    result = pd.DataFrame({
+        'Cancer': index['cancers'][rows[candidates]],
+        'Sample': index['samples'][rows[candidates]],
+        'Sample Type': index['sample_types'][rows[candidates]],
+        'Distance Correlation': dcorr,
+    })
+    result = result.dropna(subset=['Distance Correlation'])
+    return result.nlargest(top_k, 'Distance Correlation').reset_index(drop=True)
+
+def query_centroid_index_by_sample(index: dict, cancer: str, sample, **kwargs):
+    """
+    Find the centroids of a dataset most similar to one of its samples, excluding the sample itself
+    """
+    hit = np.flatnonzero((index['cancers'] == cancer) & (index['samples'] == str(sample)))
+    if hit.size == 0:
+        raise ValueError(f"Sample {sample} not found in dataset {cancer}.")
+    n_pcs = int(index['cancer_n_pcs'][index['cancer_names'] == cancer][0])
+    return query_centroid_index(
+        index, cancer, index['vectors'][hit[0], :n_pcs], exclude=sample, **kwargs
+    )
+
+def build_deg_index(degs: dict, gene_col: str = 'gene'):
+    """
+    Build an inverted index over every DEG table in `degs` (dataset → contrast → table),
+    mapping each gene to the (dataset, contrast, row) entries where it appears.
+
+    Entries are sorted by gene, so the hits of one gene are a contiguous slice
+    given by 'offsets'. Numeric columns of the tables are held in flat arrays.
+
+    Returns:
+        index: dict with 'genes' (upper-cased lookup keys), 'gene_to_code', 'offsets',
+               'contrasts', 'contrast_codes', 'rows', 'symbols' (gene names as
+               written in each table), 'stats' and 'membership'
+               (sparse contrasts × genes boolean matrix).
+    """
+    contrasts, tables = [], []
+    # Seeded with empty blocks so an empty `degs` gives an empty index
+    gene_blocks = [np.empty(0, dtype=object)]
+    symbol_blocks = [np.empty(0, dtype=object)]
+    contrast_blocks = [np.empty(0, dtype=np.int32)]
+    row_blocks = [np.empty(0, dtype=np.int32)]
+
+    for dataset, dataset_degs in degs.items():
+        for contrast, table in dataset_degs.items():
+            code = len(contrasts)
+            contrasts.append((dataset, contrast))
+            # Missing or blank gene names are skipped; rows keep their original position
+            symbols = table[gene_col].astype(str).str.strip()
+            keep = table[gene_col].notna().values & (symbols.values != '')
+            rows = np.flatnonzero(keep).astype(np.int32)
+            symbol_blocks.append(symbols.to_numpy(dtype=object)[keep])
+            gene_blocks.append(symbols.str.upper().to_numpy(dtype=object)[keep])
+            contrast_blocks.append(np.full(len(rows), code, dtype=np.int32))
+            row_blocks.append(rows)
+            tables.append(table)
+
+    all_genes = np.concatenate(gene_blocks)
+    genes, gene_codes = np.unique(all_genes, return_inverse=True)
+
+    stat_cols = []
+    for table in tables:
+        for col in table.select_dtypes(include='number').columns:
+            if col != gene_col and col not in stat_cols:
+                stat_cols.append(col)
+
+    stats = {
+        col: np.concatenate([
+            pd.to_numeric(table[col], errors='coerce').values.astype(np.float64)[rows]
+            if col in table.columns
+            else np.full(len(rows), np.nan)
+            for table, rows in zip(tables, row_blocks[1:])
+        ])
+        for col in stat_cols
+    }
+
+    order = np.argsort(gene_codes, kind='stable')
+    gene_codes = gene_codes[order]
+    offsets = np.searchsorted(gene_codes, np.arange(len(genes) + 1))
+
+    contrast_codes = np.concatenate(contrast_blocks)[order]
+    membership = sparse.csr_matrix(
+        (np.ones(len(order), dtype=np.int32), (contrast_codes, gene_codes)),
+        shape=(len(contrasts), len(genes))
+    )
+    # Genes repeated within one contrast count once
+    membership.data[:] = 1
+
+    return {
+        'genes': genes,
+        'gene_to_code': {g: i for i, g in enumerate(genes)},
+        'offsets': offsets,
+        'contrasts': pd.DataFrame(contrasts, columns=['Dataset', 'Contrast']),
+        'contrast_codes': contrast_codes,
+        'rows': np.concatenate(row_blocks)[order],
+        'symbols': np.concatenate(symbol_blocks)[order],
+        'stats': {col: values[order] for col, values in stats.items()},
+        'membership': membership,
+    }
+
+def query_deg_index(index: dict, genes):
+    """
+    Look up one gene or a list of genes across every DEG contrast.
+
+    Returns:
+        DataFrame with columns Gene, Dataset, Contrast, Row plus the stats columns,
+        one line per (gene, contrast, row) hit. Unknown genes are ignored.
+    """
+    if isinstance(genes, str):
+        genes = [genes]
+
+    codes = [
+        index['gene_to_code'][g]
+        for g in dict.fromkeys(str(g).strip().upper() for g in genes)
+        if g in index['gene_to_code']
+    ]
+
+    offsets = index['offsets']
+    hits = np.concatenate(
+        [np.arange(offsets[c], offsets[c + 1]) for c in codes]
+    ) if codes else np.empty(0, dtype=np.int64)
+
+    contrast_codes = index['contrast_codes'][hits]
+    columns = {
+        'Gene': index['symbols'][hits],
+        'Dataset': index['contrasts']['Dataset'].values[contrast_codes],
+        'Contrast': index['contrasts']['Contrast'].values[contrast_codes],
+        'Row': index['rows'][hits],
+    }
+    columns.update({col: values[hits] for col, values in index['stats'].items()})
+    return pd.DataFrame(columns, copy=False)
+
+def deg_contrast_overlap(index: dict, genes=None):
+    """
+    Count the genes shared by every pair of DEG contrasts.
+
+    Args:
+        index: index returned by `build_deg_index`.
+        genes: optional gene list; only contrasts containing at least one of
+               these genes are kept.
+
+    Returns:
+        DataFrame (contrasts × contrasts) with the number of shared genes;
+        the diagonal holds the number of genes in each contrast.
+    """
+    membership = index['membership']
+    keep = np.arange(membership.shape[0])
+
+    if genes is not None:
+        codes = [
+            index['gene_to_code'][g]
+            for g in (str(g).strip().upper() for g in genes)
+            if g in index['gene_to_code']
+        ]
+        keep = np.flatnonzero(membership[:, codes].getnnz(axis=1))
+
+    sub = membership[keep]
+    overlap = (sub @ sub.T).toarray()
+
+    labels = (
+        index['contrasts'].iloc[keep]
+        .apply(lambda r: f"{r['Dataset']}: {r['Contrast']}", axis=1)
+        .tolist()
+    )
+    return pd.DataFrame(overlap, index=labels, columns=labels)
+
+def plot_overlap_heatmap(overlap_df):
+    """
+    Plot a heatmap with the number of genes shared between DEG contrasts
+    """
+    plt.figure(figsize=(10, 8))
+    ax = sns.heatmap(
+        overlap_df,
+        cmap='rocket',
+        annot=len(overlap_df) <= 15,
+        fmt='d',
+        linecolor="lightgray",
+        xticklabels=True,
+        yticklabels=True
+    )
+
+    plt.xticks(fontsize=8, ha='right', rotation=45)
+    plt.yticks(fontsize=8)
+
+    cbar = ax.collections[0].colorbar
+    cbar.set_label('Shared Genes', fontsize=10, weight='bold')
+
+    plt.tight_layout()
+    return plt.gcf()
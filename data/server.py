@@ -1,5 +1,6 @@
 from shiny import Inputs, Outputs, Session, reactive, render, ui
 import asyncio
+import re
 import pandas as pd
 from io import StringIO
 from functions import (
@@ -10,12 +11,18 @@ from functions import (
     create_horizontal_barplot,
     plot_top_combinations,
     compute_distance_correlation_matrix,
-    cross_modal_harmony_embeddings_from_df,
+    bulk_pseudo_embeddings,
     convert_cross_modal_to_long,
+    build_centroid_index_from_centroids,
+    query_centroid_index,
+    query_centroid_index_by_sample,
+    query_deg_index,
+    deg_contrast_overlap,
+    plot_overlap_heatmap,
 
 
 )
-from data import sc_samples, degs
+from data import sc_samples, degs, centroid_index, deg_index
 
 
 def server(input, output, session):
@@ -163,20 +170,10 @@ def server(input, output, session):
             
             sc_data = sc_samples[input.cross_modal_cancer()]
             
-            pseudo_h, bulk_h = cross_modal_harmony_embeddings_from_df(
-                df_pca=sc_data['df_pca'],
-                bulk_df=bulk_df,
-                scaler=sc_data['scaler'],  
-                pca=sc_data['pca'],       
-                hvg_genes=sc_data['hv_genes'],
-                sigma=0.1
-            )
+            pseudo_h, bulk_h, sample_types = bulk_pseudo_embeddings(sc_data, bulk_df)
             
             dc_matrix, best_match = compute_distance_correlation_matrix(pseudo_h, bulk_h)
             
-            sample_to_ds = sc_data['df_pca'].drop_duplicates('sample').set_index('sample')['dataset']
-            sample_types = sample_to_ds.apply(lambda x: 'cell_line' if x == 'CCLE' else 'primary_tumor')
-            
             cross_modal_results.set({
                 'matrix': dc_matrix,
                 'best_match': best_match
@@ -219,4 +216,144 @@ def server(input, output, session):
             csv_buffer = StringIO()
             long_data.to_csv(csv_buffer, index=False)
             csv_buffer.seek(0)
-            yield csv_buffer.getvalue()
\ No newline at end of file
+            yield csv_buffer.getvalue()
+
+    search_results = reactive.Value(None)
+
+    @reactive.Effect
+    @reactive.event(input.search_cancer)
+    def _():
+        if input.search_cancer():
+            samples = centroid_index['samples'][centroid_index['cancers'] == input.search_cancer()]
+            ui.update_selectize(
+                "search_sample",
+                choices=list(samples)
+            )
+
+    @reactive.Effect
+    @reactive.event(input.run_search)
+    def _():
+        if not input.search_cancer():
+            return None
+
+        top_k = max(1, int(input.search_top_k() or 10))
+        filter_type = input.search_filter_type()
+
+        try:
+            if input.search_mode() == "bulk":
+                if not input.search_bulk_upload():
+                    return None
+
+                with ui.Progress(min=1, max=3) as p:
+                    p.set(1, message="Integrating bulk samples...", detail="This may take a while...")
+
+                    bulk_file = input.search_bulk_upload()[0]
+                    bulk_df = pd.read_csv(bulk_file['datapath'], index_col=0)
+
+                    pseudo_h, bulk_h, sample_types = bulk_pseudo_embeddings(
+                        sc_samples[input.search_cancer()], bulk_df
+                    )
+
+                    p.set(2, message="Searching...")
+
+                    # The bulk samples only share a space with the pseudo-bulk centroids
+                    # integrated in the same Harmony run, not with the prebuilt index
+                    bulk_index = build_centroid_index_from_centroids(
+                        {input.search_cancer(): pseudo_h},
+                        {input.search_cancer(): sample_types}
+                    )
+
+                    results = pd.concat(
+                        [
+                            query_centroid_index(
+                                bulk_index, input.search_cancer(), bulk_h.loc[b].values,
+                                top_k=top_k, filter_type=filter_type
+                            ).assign(Query=b)
+                            for b in bulk_h.index
+                        ],
+                        ignore_index=True
+                    )
+            elif input.search_sample():
+                results = query_centroid_index_by_sample(
+                    centroid_index, input.search_cancer(), input.search_sample(),
+                    top_k=top_k, filter_type=filter_type
+                ).assign(Query=input.search_sample())
+            else:
+                return None
+        except ValueError as e:
+            search_results.set(None)
+            ui.notification_show(str(e), type="warning")
+            return None
+
+        search_results.set(results[['Query'] + [c for c in results.columns if c != 'Query']])
+
+    @output
+    @render.data_frame
+    def search_table():
+        data = search_results()
+        if data is not None:
+            return render.DataTable(
+                data.round(5),
+                filters=True,
+                width="100%",
+                height="400px"
+            )
+        return None
+
+    @render.download(
+        filename=lambda: f"similarity_search_{input.search_cancer() or 'data'}.csv"
+    )
+    def download_search():
+        data = search_results()
+        if data is not None:
+            csv_buffer = StringIO()
+            data.to_csv(csv_buffer, index=False)
+            csv_buffer.seek(0)
+            yield csv_buffer.getvalue()
+
+    gene_search_results = reactive.Value(None)
+
+    @reactive.Effect
+    @reactive.event(input.run_gene_search)
+    def _():
+        genes = re.split(r"[\s,;]+", input.gene_query() or "")
+        genes = [g for g in genes if g]
+        if not genes:
+            return None
+
+        gene_search_results.set({
+            'hits': query_deg_index(deg_index, genes),
+            'overlap': deg_contrast_overlap(deg_index, genes)
+        })
+
+    @output
+    @render.data_frame
+    def gene_search_table():
+        data = gene_search_results()
+        if data is not None:
+            return render.DataTable(
+                data['hits'].round(5),
+                filters=True,
+                width="100%",
+                height="400px"
+            )
+        return None
+
+    @output
+    @render.plot
+    def gene_overlap_plot():
+        data = gene_search_results()
+        if data is not None and not data['overlap'].empty:
+            return plot_overlap_heatmap(data['overlap'])
+        return None
+
+    @render.download(
+        filename=lambda: "gene_search.csv"
+    )
+    def download_gene_search():
+        data = gene_search_results()
+        if data is not None:
+            csv_buffer = StringIO()
+            data['hits'].to_csv(csv_buffer, index=False)
+            csv_buffer.seek(0)
+            yield csv_buffer.getvalue()
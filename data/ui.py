@@ -131,6 +131,87 @@ app_ui = ui.page_fluid(
                 ),
                 col_widths=[4, 4, 2, 6, 6]
             )
+        ),
+        ui.nav_panel(
+            "Similarity Search",
+            ui.layout_columns(
+                ui.card(
+                    ui.layout_columns(
+                        ui.input_select(
+                            "search_cancer",
+                            "Cancer Dataset:",
+                            choices=list(sc_samples.keys()),
+                            multiple=False
+                        ),
+                        ui.input_selectize(
+                            "search_sample",
+                            "Query Sample:",
+                            choices=[],
+                            multiple=False
+                        ),
+                        ui.input_select(
+                            "search_filter_type",
+                            "Search Among:",
+                            choices={
+                                "all": "All Samples",
+                                "primary_tumor": "Primary Tumors",
+                                "cell_line": "Cell Lines"
+                            },
+                            selected="all"
+                        ),
+                        ui.input_numeric("search_top_k", "Top K:", value=10, min=1, max=100),
+                        col_widths=[3, 3, 3, 3],
+                    ),
+                ),
+                ui.card(
+                    ui.input_radio_buttons(
+                        "search_mode",
+                        "Query By:",
+                        choices={
+                            "sample": "Dataset Sample",
+                            "bulk": "Uploaded Bulk Data"
+                        },
+                        selected="sample",
+                        inline=True
+                    ),
+                    ui.input_file(
+                        "search_bulk_upload",
+                        "Upload Bulk Data:",
+                        accept=[".csv"]
+                    )),
+                ui.input_action_button("run_search", "Run Search", width="100%", class_="btn-custom-height"),
+                ui.card(
+                    ui.download_button("download_search", "Download Results", class_="btn-primary"),
+                    ui.output_data_frame("search_table"),
+                    full_screen=True
+                ),
+                col_widths=[6, 4, 2, 12]
+            )
+        ),
+        ui.nav_panel(
+            "Gene Search",
+            ui.layout_columns(
+                ui.card(
+                    ui.input_text_area(
+                        "gene_query",
+                        "Genes (comma, space or newline separated):",
+                        placeholder="TP53, MYC, EGFR",
+                        width="100%"
+                    ),
+                ),
+                ui.input_action_button("run_gene_search", "Search Genes", width="100%", class_="btn-custom-height"),
+                ui.card(
+                    ui.download_button("download_gene_search", "Download Results", class_="btn-primary"),
+                    ui.output_data_frame("gene_search_table"),
+                    full_screen=True
+                ),
+                ui.card(
+                    "Contrast Overlap (Shared DEGs)",
+                    ui.output_plot("gene_overlap_plot", height="400px"),
+                    full_screen=True
+                ),
+                col_widths=[9, 2, 6, 6]
+            )
         )
     )
 )
\ No newline at end of file
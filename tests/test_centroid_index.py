@@ -0,0 +1,136 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from functions import (
+    CENTROID_INDEX_VERSION,
+    build_centroid_index,
+    build_centroid_index_from_centroids,
+    bulk_pseudo_embeddings,
+    load_centroid_index,
+    query_centroid_index,
+    query_centroid_index_by_sample,
+    save_centroid_index,
+)
+
+
+def make_sc_samples(n_pcs=(30, 20), n_samples=150, seed=0):
+    rng = np.random.default_rng(seed)
+    sc_samples = {}
+    for cancer, pcs in zip(['A', 'B'], n_pcs):
+        samples = [f"s{i}" for i in range(n_samples)] + ['CL1']
+        df = pd.DataFrame(
+            rng.normal(size=(len(samples) * 3, pcs)),
+            columns=[f"PC{i+1}" for i in range(pcs)]
+        )
+        df['sample'] = samples * 3
+        df['dataset'] = np.where(df['sample'] == 'CL1', 'CCLE', 'TCGA')
+        sc_samples[cancer] = {'df_pca_harmony': df}
+    return sc_samples
+
+
+@pytest.fixture(scope='module')
+def index():
+    return build_centroid_index(make_sc_samples())
+
+
+def test_index_keeps_each_dataset_pc_count(index):
+    assert list(index['cancer_names']) == ['A', 'B']
+    assert list(index['cancer_n_pcs']) == [30, 20]
+    assert index['vectors'].shape == (302, 30)
+
+
+def test_query_ranks_within_dataset(index):
+    result = query_centroid_index_by_sample(index, 'B', 's3', top_k=5)
+    assert len(result) == 5
+    assert (result['Cancer'] == 'B').all()
+    assert 's3' not in result['Sample'].values
+    assert result['Distance Correlation'].is_monotonic_decreasing
+
+
+def test_noisy_copy_is_found_with_few_candidates(index):
+    rng = np.random.default_rng(1)
+    query = index['vectors'][5, :30] + rng.normal(scale=0.01, size=30)
+    result = query_centroid_index(index, 'A', query, top_k=1, n_candidates=5)
+    assert result.loc[0, 'Sample'] == index['samples'][5]
+
+
+def test_anticorrelated_query_is_found(index):
+    query = -index['vectors'][0, :30]
+    result = query_centroid_index(index, 'A', query, top_k=1, n_candidates=5)
+    assert result.loc[0, 'Sample'] == index['samples'][0]
+    assert result.loc[0, 'Distance Correlation'] == pytest.approx(1.0)
+
+
+def test_filter_type(index):
+    result = query_centroid_index_by_sample(index, 'A', 's0', filter_type='cell_line')
+    assert list(result['Sample']) == ['CL1']
+
+
+def test_query_with_wrong_pc_count_raises(index):
+    with pytest.raises(ValueError):
+        query_centroid_index(index, 'B', np.zeros(30))
+
+
+def test_save_and_load_roundtrip(index, tmp_path):
+    path = tmp_path / 'index.npz'
+    save_centroid_index(index, path)
+    loaded = load_centroid_index(path)
+    assert int(loaded['version']) == CENTROID_INDEX_VERSION
+    pd.testing.assert_frame_equal(
+        query_centroid_index_by_sample(loaded, 'A', 's1'),
+        query_centroid_index_by_sample(index, 'A', 's1'),
+    )
+
+
+def test_load_outdated_index_raises(index, tmp_path):
+    path = tmp_path / 'index.npz'
+    save_centroid_index({**index, 'version': np.array(CENTROID_INDEX_VERSION - 1)}, path)
+    with pytest.raises(ValueError):
+        load_centroid_index(path)
+
+
+def test_build_from_centroids():
+    centroids = pd.DataFrame(np.eye(4), index=['p0', 'p1', 'p2', 'p3'])
+    sample_types = pd.Series(['cell_line', 'primary_tumor', 'primary_tumor', 'cell_line'],
+                             index=centroids.index)
+    index = build_centroid_index_from_centroids({'A': centroids}, {'A': sample_types})
+    result = query_centroid_index(index, 'A', [0, 0, 1, 0], top_k=1)
+    assert result.loc[0, 'Sample'] == 'p2'
+    assert result.loc[0, 'Sample Type'] == 'primary_tumor'
+
+
+def test_save_leaves_no_temporary_files(index, tmp_path):
+    path = tmp_path / 'index.npz'
+    save_centroid_index(index, path)
+    save_centroid_index(index, path)
+    assert [p.name for p in tmp_path.iterdir()] == ['index.npz']
+
+
+def test_filter_leaving_no_samples_raises(index):
+    # CL1 is the only cell line in A, and the query sample is excluded
+    with pytest.raises(ValueError, match="No samples found"):
+        query_centroid_index_by_sample(index, 'A', 'CL1', filter_type='cell_line')
+
+
+class _Identity:
+    def transform(self, X):
+        return np.asarray(X, dtype=float)
+
+
+def test_bulk_pseudo_embeddings_share_one_space():
+    rng = np.random.default_rng(2)
+    n_pcs = 5
+    genes = [f"G{i}" for i in range(n_pcs)]
+    df_pca = pd.DataFrame(rng.normal(size=(40, n_pcs)), columns=[f"PC{i+1}" for i in range(n_pcs)])
+    df_pca['sample'] = [f"p{i % 8}" for i in range(40)]
+    df_pca['dataset'] = np.where(df_pca['sample'] == 'p0', 'CCLE', 'TCGA')
+    sc_data = {'df_pca': df_pca, 'scaler': _Identity(), 'pca': _Identity(), 'hv_genes': genes}
+    bulk_df = pd.DataFrame(rng.normal(size=(2, n_pcs)), index=['b1', 'b2'], columns=genes)
+
+    pseudo_h, bulk_h, sample_types = bulk_pseudo_embeddings(sc_data, bulk_df, n_pcs=n_pcs)
+
+    assert list(pseudo_h.columns) == list(bulk_h.columns)
+    assert list(bulk_h.index) == ['b1', 'b2']
+    assert sample_types['p0'] == 'cell_line'
+    assert set(sample_types.drop('p0')) == {'primary_tumor'}
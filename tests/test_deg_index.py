@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+
+from functions import build_deg_index, deg_contrast_overlap, query_deg_index
+
+
+def make_degs():
+    return {
+        'D1': {
+            'c1': pd.DataFrame({
+                'gene': ['TP53', 'MYC', 'EGFR', 'TP53'],
+                'logfoldchanges': [1.0, 2.0, -1.0, 0.5],
+                'pvals_adj': [0.01, 0.02, 0.03, 0.04],
+            }),
+            'c2': pd.DataFrame({
+                'gene': ['myc', 'KRAS'],
+                'logfoldchanges': [3.0, -2.0],
+                'pvals_adj': ['0.5', 'n/a'],
+            }),
+        },
+        'D2': {
+            'c3': pd.DataFrame({
+                'gene': ['EGFR', 'BRCA1', 'TP53'],
+                'logfoldchanges': [0.1, 0.2, 0.3],
+            }),
+        },
+    }
+
+
+def test_single_gene_lookup():
+    index = build_deg_index(make_degs())
+    result = query_deg_index(index, 'tp53')
+    assert list(zip(result['Dataset'], result['Contrast'], result['Row'])) == [
+        ('D1', 'c1', 0), ('D1', 'c1', 3), ('D2', 'c3', 2)
+    ]
+    assert list(result['logfoldchanges']) == [1.0, 0.5, 0.3]
+    assert np.isnan(result['pvals_adj'].iloc[2])
+
+
+def test_gene_list_lookup_ignores_unknown_genes():
+    index = build_deg_index(make_degs())
+    result = query_deg_index(index, ['MYC', 'NOT_A_GENE', 'KRAS'])
+    assert set(result['Gene']) == {'MYC', 'myc', 'KRAS'}
+    assert len(result) == 3
+    assert query_deg_index(index, ['NOT_A_GENE']).empty
+
+
+def test_mixed_type_stats_are_coerced():
+    index = build_deg_index(make_degs())
+    result = query_deg_index(index, ['MYC', 'KRAS'])
+    pvals = dict(zip(zip(result['Gene'], result['Contrast']), result['pvals_adj']))
+    assert pvals[('MYC', 'c1')] == 0.02
+    assert pvals[('myc', 'c2')] == 0.5
+    assert np.isnan(pvals[('KRAS', 'c2')])
+
+
+def test_overlap_counts_repeated_genes_once():
+    index = build_deg_index(make_degs())
+    overlap = deg_contrast_overlap(index)
+    assert overlap.loc['D1: c1', 'D1: c1'] == 3
+    assert overlap.loc['D1: c1', 'D1: c2'] == 1
+    assert overlap.loc['D1: c1', 'D2: c3'] == 2
+    assert overlap.loc['D1: c2', 'D2: c3'] == 0
+
+
+def test_overlap_restricted_to_query_genes():
+    index = build_deg_index(make_degs())
+    overlap = deg_contrast_overlap(index, ['KRAS'])
+    assert list(overlap.index) == ['D1: c2']
+
+
+def test_empty_degs():
+    index = build_deg_index({})
+    assert query_deg_index(index, 'TP53').empty
+    assert deg_contrast_overlap(index).empty
+
+
+def test_original_symbols_are_returned():
+    degs = {'D1': {'c1': pd.DataFrame({'gene': ['C9orf72', 'C1orf112'], 'lfc': [1.0, 2.0]})}}
+    index = build_deg_index(degs)
+    result = query_deg_index(index, ['c9orf72', 'C1ORF112'])
+    assert sorted(result['Gene']) == ['C1orf112', 'C9orf72']
+
+
+def test_missing_gene_names_are_skipped():
+    degs = {
+        'D1': {
+            'c1': pd.DataFrame({
+                'gene': ['TP53', None, 'MYC', np.nan, ' '],
+                'lfc': [1.0, 2.0, 3.0, 4.0, 5.0],
+            }),
+            'c2': pd.DataFrame({'gene': [np.nan, 'MYC'], 'lfc': [6.0, 7.0]}),
+        },
+    }
+    index = build_deg_index(degs)
+    assert list(index['genes']) == ['MYC', 'TP53']
+    assert query_deg_index(index, ['NAN', 'NONE', '']).empty
+
+    result = query_deg_index(index, 'MYC')
+    assert list(zip(result['Contrast'], result['Row'], result['lfc'])) == [
+        ('c1', 2, 3.0), ('c2', 1, 7.0)
+    ]
+
+    overlap = deg_contrast_overlap(index)
+    assert overlap.loc['D1: c1', 'D1: c1'] == 2
+    assert overlap.loc['D1: c1', 'D1: c2'] == 1